@@ -1,72 +1,116 @@
 import json
+import os
+import shutil
 import sys
 import tempfile
-from functools import wraps
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
 from pathlib import Path
 from typing import Callable
 
 import requests
 from fpdf import FPDF
 
+FONTS_DIR = Path("C:/Windows/Fonts") if sys.platform == "win32" else Path("/usr/share/fonts")
+
+patch_lock = threading.Lock()
+# Reuse the connections to Google Fonts
+session = requests.Session()
+
+# Style names used in the font file names and their FPDF equivalents
+FONT_STYLES = {
+    "Regular": "",
+    "Bold": "B",
+    "Italic": "I",
+    "BoldItalic": "BI",
+}
+
 
 def patch_output_method(pdf: FPDF, callback: Callable[[], None]):
     """Set a callback to be run after the `output()` metod of a PDF is called."""
-    old_output = pdf.output
+    # Fonts can be downloaded in parallel, so don't lose any callback
+    with patch_lock:
+        old_output = pdf.output
 
-    @wraps(old_output)
-    def output(*args, **kwargs):
-        ret = old_output(*args, **kwargs)
-        callback()
-        return ret
+        @wraps(old_output)
+        def output(*args, **kwargs):
+            ret = old_output(*args, **kwargs)
+            callback()
+            return ret
 
-    pdf.output = output  # type: ignore
+        pdf.output = output  # type: ignore
     return pdf
 
 
-def get_path_to_font(font_name: str, font_style="Regular", pdf: FPDF | None = None):
-    """Return the path to a font. If the font is not installed, download it from Google Fonts."""
-    fonts_dir = Path("C:/Windows/Fonts") if sys.platform == "win32" else Path("/usr/share/fonts")
-    font_filename = f"{font_name}-{font_style}.ttf"
-    font_file = fonts_dir / font_filename
-    if font_file.exists():
-        return font_file
+@lru_cache(maxsize=None)
+def get_local_fonts(font_name: str) -> dict[str, Path]:
+    """Return the installed files of a font family, by style."""
+    filenames = {f"{font_name}-{style}.ttf".casefold(): style for style in FONT_STYLES}
+    fonts = {}
+    try:
+        # List the directory once instead of checking each file
+        with os.scandir(FONTS_DIR) as entries:
+            for entry in entries:
+                style = filenames.get(entry.name.casefold())
+                if style and entry.is_file():
+                    fonts[style] = Path(entry.path)
+    except OSError:
+        pass
+    return fonts
+
 
-    resp = requests.get("https://fonts.google.com/download/list", {"family": font_name})
+@lru_cache(maxsize=None)
+def get_font_files(font_name: str) -> dict[str, dict]:
+    """Return the files that can be downloaded from Google Fonts for a font family, by filename."""
+    resp = session.get("https://fonts.google.com/download/list", {"family": font_name})
     data = json.loads(resp.text.lstrip(")]}'"))
-    for file in data["manifest"]["fileRefs"]:
-        if file["filename"].removeprefix("static/") == font_filename:
-            resp = requests.get(file["url"], stream=True)
-            with tempfile.NamedTemporaryFile("wb", suffix=Path(file["filename"]).suffix, delete=False) as f:
-                for chunk in resp.iter_content(65536):
-                    f.write(chunk)
-                if pdf:
-                    patch_output_method(pdf, Path(f.name).unlink)
-                return f.name
+    return {file["filename"].removeprefix("static/"): file for file in data["manifest"]["fileRefs"]}
+
 
-    return None
+def download_font(font_name: str, font_style="Regular", pdf: FPDF | None = None):
+    """Download a font from Google Fonts and return its path or `None` if it doesn't exist."""
+    file = get_font_files(font_name).get(f"{font_name}-{font_style}.ttf")
+    if not file:
+        return None
+
+    resp = session.get(file["url"], stream=True)
+    # Let urllib3 decompress the response if needed
+    resp.raw.decode_content = True
+    with tempfile.NamedTemporaryFile("wb", suffix=Path(file["filename"]).suffix, delete=False) as f:
+        shutil.copyfileobj(resp.raw, f, 1 << 20)
+    # The downloaded file is removed once the PDF is saved, so it can't be cached
+    if pdf:
+        patch_output_method(pdf, Path(f.name).unlink)
+    return f.name
+
+
+def get_path_to_font(font_name: str, font_style="Regular", pdf: FPDF | None = None):
+    """Return the path to a font. If the font is not installed, download it from Google Fonts."""
+    return get_local_fonts(font_name).get(font_style) or download_font(font_name, font_style, pdf)
 
 
 def add_font(pdf: FPDF, font_name: str, font_style="all"):
     if font_style == "all":
-        add_font(pdf, font_name, "Regular")
-        add_font(pdf, font_name, "Bold")
-        add_font(pdf, font_name, "Italic")
-        add_font(pdf, font_name, "BoldItalic")
+        font_paths: dict[str, str | Path | None] = {**get_local_fonts(font_name)}
+        missing = [style for style in FONT_STYLES if style not in font_paths]
+        if missing:
+            # Fetch the manifest once before the downloads start
+            get_font_files(font_name)
+            # Download the fonts in parallel but register them here because FPDF isn't thread-safe
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                downloaded = executor.map(lambda style: download_font(font_name, style, pdf), missing)
+                font_paths.update(zip(missing, downloaded))
+        for style in FONT_STYLES:
+            register_font(pdf, font_name, style, font_paths[style])
         return
 
-    font_path = get_path_to_font(font_name, font_style, pdf)
+    register_font(pdf, font_name, font_style, get_path_to_font(font_name, font_style, pdf))
+
+
+def register_font(pdf: FPDF, font_name: str, font_style: str, font_path: str | Path | None):
+    """Add a font file to a PDF."""
     if font_path:
-        pdf.add_font(
-            font_name,
-            {
-                "Regular": "",
-                "Bold": "B",
-                "Italic": "I",
-                "BoldItalic": "BI",
-            }[
-                font_style
-            ],  # type: ignore
-            font_path,
-        )
+        pdf.add_font(font_name, FONT_STYLES[font_style], font_path)  # type: ignore
     else:
         raise RuntimeError(f"Unable to find font: {font_name}-{font_style}")
@@ -1,6 +1,6 @@
 import os
 import re
-from contextvars import ContextVar
+from collections import defaultdict
 from dataclasses import dataclass, field
 from pathlib import Path
 
@@ -13,8 +13,15 @@ from fonts import add_font
 from .tt_parser import TimetableParser
 from .utils import CLI, Day, Hour, Lesson, Pause, Pauses, PausesContainer, Settings, Timetable, Week, app, range_any
 
-left_week = ContextVar("left_week", default="")
-right_week = ContextVar("right_week", default="")
+# Position of the lessons in the day column, depending on their week
+WEEK_OFFSETS = {
+    Week.ALWAYS: 0,
+    Week.LEFT: 0,
+    Week.RIGHT: 0.5,
+}
+
+# This needs the standard `re` module: lookbehind assertions aren't supported by RE2
+split_superscripts = re.compile(r"((?<=[IVX]|\d)(?:e|er|ère|ème|nde)s?\b|(?<=M)me|(?<=T)a?le)").split
 
 
 class PatchedFPDF(FPDF):
@@ -25,10 +32,76 @@ class PatchedFPDF(FPDF):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self._string_widths: dict[tuple, float] = {}
+        self._max_char_widths: dict[str, float] = {}
+        # Reduce the font size of the texts that don't fit in their cells
+        self.shrink_text = True
         self.set_auto_page_break(False, 10)
         add_font(self, "Montserrat")
         self.set_font("Montserrat")
 
+    def get_string_width(self, s, normalized=False, markdown=False):
+        """
+        Return the length of a string in user unit.
+        The results are cached because the same texts are measured many times.
+        """
+        # The text shaping options are a dict, so they can't be part of the key
+        if self.text_shaping:
+            return super().get_string_width(s, normalized, markdown)
+        key = (
+            s,
+            normalized,
+            markdown,
+            self.font_family,
+            self.font_style,
+            self.font_size_pt,
+            self.font_stretching,
+            self.char_spacing,
+            self.char_vpos,
+            self.sub_scale,
+            self.sup_scale,
+            self.nom_scale,
+            self.denom_scale,
+            tuple(self._fallback_font_ids),
+            self._fallback_font_exact_match,
+        )
+        width = self._string_widths.get(key)
+        if width is None:
+            width = self._string_widths[key] = super().get_string_width(s, normalized, markdown)
+        return width
+
+    def max_string_width(self, s: str):
+        """
+        Return an upper bound of the length of a string in user unit, without measuring each character.
+        This is `inf` if the width depends on something else than the characters.
+
+        >>> pdf = PatchedFPDF()
+        >>> pdf.max_string_width("Maths") >= pdf.get_string_width("Maths")
+        True
+        >>> # The missing characters are drawn with the fallback fonts, which may be wider
+        >>> pdf.set_fallback_fonts(["Montserrat"])
+        >>> pdf.max_string_width("Maths")
+        inf
+        """
+        if self.text_shaping or self.font_stretching != 100 or self.char_spacing or self._fallback_font_ids:
+            return float("inf")
+        # Superscripts and subscripts can be scaled up
+        scales = {
+            CharVPos.SUP: self.sup_scale,
+            CharVPos.SUB: self.sub_scale,
+            CharVPos.NOM: self.nom_scale,
+            CharVPos.DENOM: self.denom_scale,
+        }
+        if scales.get(self.char_vpos, 1) > 1:
+            return float("inf")
+        font = self.current_font
+        max_char_width = self._max_char_widths.get(font.fontkey)
+        if max_char_width is None:
+            # The characters that aren't in the font use the default width
+            default_width = font.cw.default_factory() if isinstance(font.cw, defaultdict) else 0
+            max_char_width = self._max_char_widths[font.fontkey] = max(default_width, *font.cw.values())
+        return len(s) * max_char_width * self.font_size / 1000
+
     def cell(
         self, w: float | None = None, h: float | None = None, txt: str = "", *args, **kwargs
     ):  # pylint: disable=W1113
@@ -36,15 +109,13 @@ class PatchedFPDF(FPDF):
         if w == 0:
             w = self.w - self.r_margin - self.x
         font_size = None
-        if (
-            txt
-            and txt not in (left_week.get(), right_week.get())
-            and txt[-3:-2] != ":"
-            and w
-            and (str_width := self.get_string_width(txt)) > (target_width := w - self.c_margin * 2)
-        ):
-            font_size = self.font_size_pt
-            self.set_font_size(font_size * target_width / str_width)
+        # Don't shrink the hours (H:MM)
+        if txt and self.shrink_text and (len(txt) < 3 or txt[-3] != ":") and w:
+            target_width = w - self.c_margin * 2
+            # Only measure the text if it may be too long
+            if self.max_string_width(txt) > target_width and (str_width := self.get_string_width(txt)) > target_width:
+                font_size = self.font_size_pt
+                self.set_font_size(font_size * target_width / str_width)
         super().cell(w, h, txt, *args, **kwargs)
         if font_size is not None:
             self.set_font_size(font_size)
@@ -59,7 +130,7 @@ class PatchedFPDF(FPDF):
 
         ret = []
         for frag in frags:
-            parts = re.split(r"((?<=[IVX]|\d)(?:e|er|ère|ème|nde)s?\b|(?<=M)me|(?<=T)a?le)", frag.string)
+            parts = split_superscripts(frag.string)
             for i, part in enumerate(parts):
                 if not part:
                     continue
@@ -77,17 +148,20 @@ class HoursManager:
 
     renderer: "TimetableRenderer"
     _hours_width: float | None = field(default=None, init=False)
+    _y_for_hour: dict[Hour, float] = field(default_factory=dict, init=False)
 
     def __post_init__(self):
-        starts: list[Hour] = []
-        ends: list[Hour] = []
+        start_hour: Hour | None = None
+        end_hour: Hour | None = None
         for day in self.renderer.timetable.days:
             for lesson in day:
-                starts.append(lesson.start)
-                ends.append(lesson.end)
+                if start_hour is None or lesson.start < start_hour:
+                    start_hour = lesson.start
+                if end_hour is None or lesson.end > end_hour:
+                    end_hour = lesson.end
 
-        self.start_hour = min(starts) if starts else None
-        self.end_hour = max(ends) if ends else None
+        self.start_hour = start_hour
+        self.end_hour = end_hour
 
     @property
     def day_length(self):
@@ -132,6 +206,8 @@ class HoursManager:
 
     def render(self, interval: Hour | float = 1):
         """Render the hours (at the left of the timetable) with the given interval."""
+        # The positions depend on the PDF, so forget the ones from a previous rendering
+        self._y_for_hour.clear()
         if self.start_hour is None or self.end_hour is None:
             assert self.start_hour is None and self.end_hour is None, "Only one of the hours is None"
             return
@@ -149,12 +225,10 @@ class HoursManager:
         self._hours_width = (
             max(self.renderer.pdf.get_string_width(str(hour)) for hour in hours) + 2 * self.renderer.pdf.c_margin
         )
-        # Don't use unpacking (will fail if there is only 1 hour)
-        # so first_hour and last_hour can be the same
-        first_hour = hours[0]
-        last_hour = hours[-1]
-        for hour in hours:
-            self.render_one_hour(hour, first_or_last=hour in (first_hour, last_hour))
+        # Compare the indexes (the first and last hours can be the same if there is only 1 hour)
+        last_i = len(hours) - 1
+        for i, hour in enumerate(hours):
+            self.render_one_hour(hour, first_or_last=i in (0, last_i))
 
     def render_one_hour(self, hour: Hour, first_or_last=False):
         """Display one hour."""
@@ -169,31 +243,36 @@ class HoursManager:
         assert self.start_hour is not None, "Attempt to use y_for_hour on a timetable without hours"
         assert self.end_hour is not None, "Attempt to use y_for_hour on a timetable without hours"
 
+        # Many lessons start and end at the same hours
+        if hour in self._y_for_hour:
+            return self._y_for_hour[hour]
+        key = hour
+
         if self.renderer.settings.wrap_hour:
             if hour == self.renderer.settings.wrap_hour:
                 hour -= 0.5
             if hour > self.renderer.settings.wrap_hour:
                 hour -= 1
 
-        return (
+        y = self._y_for_hour[key] = (
             self.renderer.pdf.t_margin
             + self.renderer.settings.title_height
             + self.renderer.settings.day_height
             + self.renderer.eff_day_height * ((hour - self.start_hour) / float(self.day_length))
         )
+        return y
 
 
 @dataclass
 class LessonMetrics:
     """Metrics about a lesson cell."""
 
-    pdf: FPDF
-    left_week: str
-    right_week: str
     x: float = 0
     start_y: float = 0
     end_y: float = 0
     week_y_pos: float = 0
+    week_width: float = 0
+    week_height: float = 0
     day_width: float = 0
     cell_height: float = 0
     top_padding: float = 0
@@ -202,31 +281,12 @@ class LessonMetrics:
 
     week_font_size = 10
 
-    @property
-    def week_margin(self):
-        """The margin in the week cells."""
-        return self.pdf.c_margin / 2
-
-    @property
-    def week_width(self):
-        """The width of a week label."""
-        with self.pdf.use_font_face(FontFace(size_pt=self.week_font_size)):
-            return (
-                max(self.pdf.get_string_width(self.left_week), self.pdf.get_string_width(self.right_week))
-                + 2 * self.week_margin
-            )
-
-    @property
-    def week_height(self):
-        """The height of a week label."""
-        return self.week_font_size / self.pdf.k + 2 * self.week_margin
-
     @property
     def height(self):
         """
         The height of the cell.
 
-        >>> LessonMetrics(FPDF(), "", "", start_y=10, end_y=30).height
+        >>> LessonMetrics(start_y=10, end_y=30).height
         20
         """
         return self.end_y - self.start_y
@@ -264,23 +324,41 @@ class DaysManager:
     """An object that manages the rendering of days."""
 
     renderer: "TimetableRenderer"
+    week_width: float = field(default=0, init=False)
+    week_height: float = field(default=0, init=False)
+
+    def measure_weeks(self):
+        """Measure the week labels (they are the same for all the lessons)."""
+        pdf = self.renderer.pdf
+        timetable = self.renderer.timetable
+        week_margin = pdf.c_margin / 2
+        self.week_height = LessonMetrics.week_font_size / pdf.k + 2 * week_margin
+        # Changing the font would write to the page, so scale the width measured with the current font size
+        self.week_width = (
+            max(pdf.get_string_width(timetable.left_week), pdf.get_string_width(timetable.right_week))
+            * LessonMetrics.week_font_size
+            / pdf.font_size_pt
+            + 2 * week_margin
+        )
 
     def render(self, day_n: int, day: Day):
         """Render a day."""
+        # Compute them once, they are the same for all the lessons of the day
+        day_width = self.day_width
         x_day = self.x_for_day(day_n)
         self.renderer.pdf.x = x_day
         self.renderer.pdf.y = self.renderer.pdf.t_margin + self.renderer.settings.title_height
 
         # Write the heading cell (day of week)
         with self.renderer.pdf.local_context(font_style="B"):
-            self.renderer.pdf.cell(self.day_width, 10, day.name, True, align=Align.C, new_x=XPos.LEFT, new_y=YPos.NEXT)
+            self.renderer.pdf.cell(day_width, 10, day.name, True, align=Align.C, new_x=XPos.LEFT, new_y=YPos.NEXT)
 
         # Draw a big rectangle that goes to bottom
         # so if the timetable finishes earlier, the column is still complete
-        self.renderer.pdf.rect(self.renderer.pdf.x, self.renderer.pdf.y, self.day_width, self.renderer.eff_day_height)
+        self.renderer.pdf.rect(self.renderer.pdf.x, self.renderer.pdf.y, day_width, self.renderer.eff_day_height)
 
         for lesson in day:
-            self.render_lesson(lesson, day_n)
+            self.render_lesson(lesson, x_day, day_width)
 
     @property
     def day_width(self):
@@ -327,40 +405,31 @@ class DaysManager:
         """
         return self.renderer.pdf.l_margin + self.day_width * day_n
 
-    def render_lesson(self, lesson: Lesson, day_n: int):
-        """Render a lesson."""
+    def render_lesson(self, lesson: Lesson, x_day: float, day_width: float):
+        """Render a lesson in the day that starts at `x_day`."""
+        pdf = self.renderer.pdf
+        settings = self.renderer.settings
+        filled = bool(lesson.color) and not settings.black_white
+
         # Set the background if there is any
-        if lesson.color and not self.renderer.settings.black_white:
-            self.renderer.pdf.set_fill_color(lesson.color)  # type: ignore
+        if filled:
+            pdf.set_fill_color(lesson.color)  # type: ignore
 
         week = lesson.week
-        metrics = LessonMetrics(
-            self.renderer.pdf, self.renderer.timetable.left_week, self.renderer.timetable.right_week
-        )
-        metrics.x = (
-            self.x_for_day(day_n)
-            + {
-                Week.ALWAYS: 0,
-                Week.LEFT: 0,
-                Week.RIGHT: 0.5,
-            }[week]
-            * self.day_width
-        )
+        metrics = LessonMetrics(week_width=self.week_width, week_height=self.week_height)
+        metrics.x = x_day + WEEK_OFFSETS[week] * day_width
         metrics.start_y = self.renderer.hours.y_for_hour(lesson.start)
         metrics.end_y = self.renderer.hours.y_for_hour(lesson.end)
-        self.renderer.pdf.x = metrics.x
-        self.renderer.pdf.y = metrics.start_y
-
-        metrics.day_width = self.day_width / (1 if week == Week.ALWAYS else 2)
-        # Add all items to the list, otherwise it messes up the styles
-        items = [
-            lesson.name.strip(),
-            lesson.teacher.strip() if self.renderer.settings.show_teacher else "",
-            lesson.room.strip() if self.renderer.settings.show_room else "",  # type: ignore
-        ]
+        pdf.x = metrics.x
+        pdf.y = metrics.start_y
+
+        metrics.day_width = day_width / (1 if week == Week.ALWAYS else 2)
+        name = lesson.name.strip()
+        teacher = lesson.teacher.strip() if settings.show_teacher else ""
+        room = lesson.room.strip() if settings.show_room else ""  # type: ignore
 
-        items_n = sum(bool(item) for item in items)
-        week_shown = week != Week.ALWAYS and self.renderer.settings.show_weeks
+        items_n = bool(name) + bool(teacher) + bool(room)
+        week_shown = week != Week.ALWAYS and settings.show_weeks
         metrics.calculate(week_shown, items_n)
         # if lesson_height < items_n * cell_height:
         #     cell_height = lesson_height / items_n
@@ -371,44 +440,30 @@ class DaysManager:
             else (metrics.height - metrics.top_padding - 2 * metrics.top_bottom_padding - metrics.bottom_padding)
             / items_n
         )
-        x = self.renderer.pdf.x
-        y = self.renderer.pdf.y
+        x = pdf.x
+        y = pdf.y
         # Draw a rectangle around the lesson
         # because lines are put as separate cells
-        self.renderer.pdf.rect(
+        pdf.rect(
             x,
             y,
             metrics.day_width,
             metrics.height,
-            RenderStyle.DF if lesson.color and not self.renderer.settings.black_white else RenderStyle.D,
+            RenderStyle.DF if filled else RenderStyle.D,
         )
 
         # Leave some space at the top
-        self.renderer.pdf.y += metrics.top_bottom_padding + metrics.top_padding
+        pdf.y += metrics.top_bottom_padding + metrics.top_padding
 
-        for i, item in enumerate(items):
-            if not item:
-                continue
-            with self.renderer.pdf.use_font_face(FontFace(emphasis=("B", "", "I")[i])):
-                if "\n" in item:
-                    # Attempt to wrap only if there is a hard line break
-                    self.renderer.pdf.multi_cell(
-                        metrics.day_width,
-                        cell_height,
-                        item,
-                        align=Align.C,
-                        max_line_height=(cell_height / (item.count("\n") + 1)),
-                        new_x=XPos.LEFT,
-                        new_y=YPos.NEXT,
-                    )
-                else:
-                    # Otherwise display everything on one line and reduce the font size
-                    self.renderer.pdf.cell(
-                        metrics.day_width, cell_height, item, align=Align.C, new_x=XPos.LEFT, new_y=YPos.NEXT
-                    )
+        if name:
+            self.render_item(name, "B", metrics.day_width, cell_height)
+        if teacher:
+            self.render_item(teacher, "", metrics.day_width, cell_height)
+        if room:
+            self.render_item(room, "I", metrics.day_width, cell_height)
 
         # Leave some space at the bottom
-        self.renderer.pdf.y += metrics.top_bottom_padding + metrics.bottom_padding
+        pdf.y += metrics.top_bottom_padding + metrics.bottom_padding
 
         # Display the week
         if week_shown:
@@ -418,39 +473,56 @@ class DaysManager:
         if lesson.removed:
             self.striketrough(x, y, metrics.day_width, metrics.height)
 
+    def render_item(self, item: str, emphasis: str, width: float, height: float):
+        """Render a line of a lesson (name, teacher or room) and go to the next line."""
+        with self.renderer.pdf.use_font_face(FontFace(emphasis=emphasis)):
+            if "\n" in item:
+                # Attempt to wrap only if there is a hard line break
+                self.renderer.pdf.multi_cell(
+                    width,
+                    height,
+                    item,
+                    align=Align.C,
+                    max_line_height=(height / (item.count("\n") + 1)),
+                    new_x=XPos.LEFT,
+                    new_y=YPos.NEXT,
+                )
+            else:
+                # Otherwise display everything on one line and reduce the font size
+                # (always go through cell() so the superscripts and the embedded font subset are handled)
+                self.renderer.pdf.cell(width, height, item, align=Align.C, new_x=XPos.LEFT, new_y=YPos.NEXT)
+
     def render_week(self, metrics: LessonMetrics, week: Week):
         """Render the week at the pre-configured position."""
-        token1 = left_week.set(self.renderer.timetable.left_week)
-        token2 = right_week.set(self.renderer.timetable.right_week)
-        with self.renderer.pdf.use_font_face(FontFace(size_pt=metrics.week_font_size)):
-            a = self.renderer.pdf.x
-            b = self.renderer.pdf.y
-            self.renderer.pdf.x = metrics.x + metrics.day_width - metrics.week_width
-            self.renderer.pdf.y = metrics.week_y_pos
-            self.renderer.pdf.cell(
-                metrics.week_width,
-                metrics.week_height,
-                {
-                    Week.ALWAYS: "",
-                    Week.LEFT: self.renderer.timetable.left_week,
-                    Week.RIGHT: self.renderer.timetable.right_week,
-                }[week],
-                True,
-                align=Align.C,
-                new_x=XPos.RIGHT,
-                new_y=YPos.TOP,
-            )
-            self.renderer.pdf.x = a
-            self.renderer.pdf.y = b
-        left_week.reset(token1)
-        right_week.reset(token2)
+        pdf = self.renderer.pdf
+        # The week labels have their own width, don't shrink them
+        shrink_text = getattr(pdf, "shrink_text", True)
+        pdf.shrink_text = False
+        try:
+            with pdf.use_font_face(FontFace(size_pt=metrics.week_font_size)):
+                a = pdf.x
+                b = pdf.y
+                pdf.x = metrics.x + metrics.day_width - metrics.week_width
+                pdf.y = metrics.week_y_pos
+                pdf.cell(
+                    metrics.week_width,
+                    metrics.week_height,
+                    self.renderer.timetable.week_name(week),
+                    True,
+                    align=Align.C,
+                    new_x=XPos.RIGHT,
+                    new_y=YPos.TOP,
+                )
+                pdf.x = a
+                pdf.y = b
+        finally:
+            pdf.shrink_text = shrink_text
 
     def striketrough(self, x, y, width, height):
         """Strike through a specified rectangular area, from top left to bottom right."""
         # Use butt style so the line doesn't overflow an already existing rectangle
         with self.renderer.pdf.local_context(stroke_cap_style=StrokeCapStyle.BUTT):
             step = 5  # mm
-            position = step
             maximum = height + width
             # 15 20 25 30 ...
             # 10
@@ -465,38 +537,15 @@ class DaysManager:
                 # Before 15, start from the bottom and move `position` upwards
                 y1 = (y + height - position) if position <= height else y
 
-                # End position of the line
-                x2 = x1 + height
-                y2 = y1 + height
-
-                # Limit the line to the bottom of the cell
-                if y2 > y + height:
-                    # ┌────────┐
-                    # │        │
-                    # │a       │
-                    # └─*──────┘ ← y + height \
-                    #    *                    | diff
-                    #      b     ← y2         /
-                    # Calculate the difference and remove it to x and y (to keep the line in the good direction)
-                    diff = y2 - (y + height)
-                    y2 -= diff
-                    x2 -= diff
-
-                # Limit the line to the right of the cell
-                if x2 > x + width:
-                    # ┌────────┐
-                    # │       a│
-                    # │        *
-                    # └────────┘*
-                    #            b
-                    # x+width ↑  ↑ x2
-                    #         \__/ diff
-                    # Calculate the difference and remove it to x and y (to keep the line in the good direction)
-                    diff = x2 - (x + width)
-                    x2 -= diff
-                    y2 -= diff
-
-                self.renderer.pdf.line(x1, y1, x2, y2)
+                # The line goes down-right at 45°, so it stops on the first border it meets:
+                # the bottom of the cell (y + height) or its right side (x + width)
+                # ┌────────┐   ┌────────┐
+                # │        │   │       a│
+                # │a       │   │        b
+                # └─b──────┘   └────────┘
+                length = min(y + height - y1, x + width - x1)
+
+                self.renderer.pdf.line(x1, y1, x1 + length, y1 + length)
 
 
 @dataclass
@@ -526,6 +575,7 @@ class TimetableRenderer:
         # and it's easier for the rest of the process
         self.pdf.l_margin += self.hours.width
 
+        self.days.measure_weeks()
         for i, day in enumerate(self.timetable):
             self.days.render(i, day)
 
@@ -615,7 +665,7 @@ def real_main(settings: CLI):
 
     file = settings.output
     if isinstance(file, str):
-        file = file % {"timetables": "_".join(re.split(r"[\\/]", path)[-1] for path in settings.timetable_paths)}
+        file = file % {"timetables": "_".join(os.path.basename(path) for path in settings.timetable_paths)}
 
     pdf.output(str(file))
     if settings.open:
@@ -5,7 +5,19 @@ from pprint import pp
 
 from .utils import Day, Hour, Lesson, Settings, Timetable, Week
 
-is_hr = re.compile(r"^---+$").match
+
+def is_hr(line: str) -> bool:
+    """
+    Return `True` if the line is a horizontal line (at least 3 dashes).
+
+    >>> is_hr("---"), is_hr("--"), is_hr("--- -")
+    (True, False, False)
+    """
+    return len(line) >= 3 and not line.strip("-")
+
+
+# Cheap check that is done before running the full lesson regex
+is_lesson = re.compile(r"\d+[:h]\d+\s*-\s*\d+[:h]\d+").match
 get_lesson = re.compile(
     r"""(?x)
 ^
@@ -53,20 +65,24 @@ class TimetableParser:
         self.in_config = False
 
         self.config: dict[str, str] = {}
+        # Values from the config that are used for each lesson
+        self.weeks: dict[str, Week] = {}
+        self.colors: dict[str, str] = {}
         self.current_day_name: str | None = None
         self.current_day: Day | None = None
 
-        # We use self.__dir__() because it gives the methods in the defined order (not in alphabetical order)
-        parsers = [getattr(self, method) for method in self.__dir__() if method.startswith("parse_")]
-
         for i, line in enumerate(data.splitlines(), start=1):
             # Remove whitespace at the start and at the end of the line
             line = line.strip()
-            for parser in parsers:
-                if parser(i, line):
-                    break
-            else:
-                raise ParseError(i, "No parser handled this line")
+            # Skip empty lines and comments
+            if not line or line[0] == "#":
+                continue
+            # Try the parsers in order, the last ones handle all the remaining lines (or raise an error)
+            if is_hr(line):
+                if not (self.parse_config_begin(i, line) or self.parse_config_end(i, line)):
+                    self.parse_hr(i, line)
+            elif not (self.parse_config_option(i, line) or self.parse_lesson(i, line)):
+                self.parse_day_name(i, line)
 
         if self.in_config:
             raise ValueError("Unexpected end of config, maybe you forgot to add --- at the end of the config?")
@@ -79,10 +95,6 @@ class TimetableParser:
         self.settings.hours_width = int(self.config["hours_width"]) if "hours_width" in self.config else None
         self.settings.title_shadow = self.config.get("title_shadow", "").lower() == "true"
 
-    def parse_empty_line_or_comment(self, _i: int, line: str) -> bool:
-        """Skip empty lines and comments."""
-        return not line or line[0] == "#"
-
     def parse_config_begin(self, i: int, line: str) -> bool:
         """If the first line is ---, it's the beginning of the config section."""
         if i != 1:
@@ -101,6 +113,12 @@ class TimetableParser:
             if self.lint and not self.config:
                 warnings.warn(ParseWarning(i, "Empty config"))
             self.in_config = False
+            # If both weeks have the same name, it's the left week
+            weeks = ((self.config.get("right_week"), Week.RIGHT), (self.config.get("left_week"), Week.LEFT))
+            self.weeks = {name: week for name, week in weeks if name}
+            self.colors = {
+                name.removeprefix("color."): value for name, value in self.config.items() if name.startswith("color.")
+            }
             if self.lint and len(line) > 3:
                 warnings.warn(ParseWarning(i, "The length of the horizontal line after the config is longer than 3"))
             return True
@@ -118,17 +136,14 @@ class TimetableParser:
 
     def parse_lesson(self, i: int, line: str) -> bool:
         """If the line corresponds to a lesson, add it to the current day."""
-        if match := get_lesson(line):
+        if is_lesson(line) and (match := get_lesson(line)):
             if self.current_day is None:
                 raise ParseError(i, "No current day, maybe you forgot to add --- after the day name?")
 
             week = Week.ALWAYS
             if match["week"]:
-                if match["week"] == self.config.get("left_week"):
-                    week = Week.LEFT
-                elif match["week"] == self.config.get("right_week"):
-                    week = Week.RIGHT
-                else:
+                week = self.weeks.get(match["week"])
+                if week is None:
                     raise ParseError(i, f"Invalid week: {match['week']!r}")
 
             lesson = Lesson(
@@ -137,7 +152,7 @@ class TimetableParser:
                 name=match["name"] or "",
                 teacher=match["teacher"] or "",
                 room=match["room"] or "",
-                color=match["color"] or self.config.get("color." + (match["name"] or "")),
+                color=match["color"] or self.colors.get(match["name"] or ""),
                 week=week,
                 removed=bool(match["removed"]),
             )
@@ -1,8 +1,8 @@
 import enum
 from dataclasses import dataclass, field
-from functools import total_ordering
+from functools import lru_cache
 import itertools
-from typing import Annotated, Iterable, Literal, Protocol, Self, TypeVar
+from typing import Annotated, ClassVar, Iterable, Literal, Protocol, Self, TypeVar
 
 import click
 import typer
@@ -47,21 +47,61 @@ def range_any(start: _T, end: _T | None = None, interval=1, include_end=False) -
         start, end = 0, start  # type: ignore
     reverse = end < start
     current = start
-    ok_with_abs = all(isinstance(item, (int, float)) for item in (start, end, interval)) and not all(
+    # Choose the loop once instead of checking the types at each step
+    if isinstance(start, Hour) and isinstance(end, Hour):
+        # Work on the totals, the hours are only created when they are yielded
+        from_total = type(start)._from_total
+        total, end_total, step = start.total, end.total, Hour._to_total(interval)
+        while (total > end_total) if reverse else (total < end_total):
+            yield from_total(total)
+            total = (total + step) % (24 * 60)
+        current = from_total(total)
+    elif all(isinstance(item, (int, float)) for item in (start, end, interval)) and not all(
         isinstance(item, int) for item in (start, end, interval)
-    )
-    while (
-        ((current - end) if reverse else (end - current)) > 1e-6  # type: ignore
-        if ok_with_abs
-        else (current > end) if reverse else (current < end)
     ):
-        yield current
-        current += interval
+        # Floats can't be compared exactly
+        if reverse:
+            while current - end > 1e-6:  # type: ignore
+                yield current
+                current += interval
+        else:
+            while end - current > 1e-6:  # type: ignore
+                yield current
+                current += interval
+    elif reverse:
+        while current > end:
+            yield current
+            current += interval
+    else:
+        while current < end:
+            yield current
+            current += interval
     if include_end:
         yield current
 
 
-@total_ordering
+@lru_cache(maxsize=512)
+def parse_hour_str(hour: str) -> int:
+    """
+    Return the total number of minutes of an hour string.
+
+    Timetables only use a few different hours, so the results are cached.
+
+    >>> parse_hour_str("8:30")
+    510
+    >>> parse_hour_str("14h")
+    Traceback (most recent call last):
+        ...
+    ValueError: could not convert string to float: ''
+    """
+    parts = hour.split(":", 1)
+    if len(parts) < 2:
+        parts = hour.split("h", 1)
+    if len(parts) < 2:
+        raise ValueError(f"No ':' or 'h' in hour string: {hour!r}")
+    return int((float(parts[0] or "") * 60 + float(parts[1] or "")) % (24 * 60))
+
+
 class Hour:
     """
     The representation of an hour (or an interval between two hours, e.g. 1 hour step).
@@ -76,6 +116,15 @@ class Hour:
     Hour(0, 0)
     """
 
+    __slots__ = ("total",)
+
+    # There are only 24 * 60 different hours and they are immutable, so the ones created from a total are shared
+    _instances: ClassVar[dict[int, "Hour"]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._instances = {}
+
     def __init__(self: Self, hour: Self | str | float = 0, minute: float | Literal[True] = 0):
         """
         Create an `Hour` instance.
@@ -88,7 +137,7 @@ class Hour:
         if minute is True:
             if not isinstance(hour, (int, float)):
                 raise TypeError("Trying to create an Hour instance from a total but the total is not an int/float")
-            self.total = int(hour % (24 * 60))
+            self.total = int(hour if 0 <= hour < 24 * 60 else hour % (24 * 60))
             return
 
         # If we are given an already created hour instance (like in __add__),
@@ -103,17 +152,35 @@ class Hour:
         if isinstance(hour, str):
             if minute:
                 raise TypeError("You mustn't specify the minutes argument if you give a string for hours")
-            parts = hour.split(":", 1)
-            if len(parts) < 2:
-                parts = hour.split("h", 1)
-            if len(parts) < 2:
-                raise ValueError(f"No ':' or 'h' in hour string: {hour!r}")
-            hour = float(parts[0] or "")
-            minute = float(parts[1] or "")
+            self.total = parse_hour_str(hour)
+            return
 
         self.total += hour * 60
         self.total += minute
-        self.total = int(self.total % (24 * 60))  # type: ignore
+        if not 0 <= self.total < 24 * 60:
+            self.total %= 24 * 60
+        self.total = int(self.total)
+
+    @classmethod
+    def _from_total(cls, total: float) -> Self:
+        """
+        Create an `Hour` instance from a total number of minutes without going through `__init__`.
+
+        >>> Hour._from_total(8 * 60) is Hour(7, 0) + Hour(1, 0)
+        True
+        """
+        # Most totals are already in the day, don't compute the modulo for them
+        total = int(total if 0 <= total < 24 * 60 else total % (24 * 60))
+        hour = cls._instances.get(total)
+        if hour is None:
+            hour = cls._instances[total] = object.__new__(cls)
+            hour.total = total
+        return hour
+
+    @staticmethod
+    def _to_total(value: "Hour | str | float") -> int:
+        """Return the total number of minutes of a value that can be converted to an `Hour`."""
+        return value.total if isinstance(value, Hour) else Hour(value).total
 
     @property
     def hour(self):
@@ -156,7 +223,8 @@ class Hour:
         >>> Hour(9, 0).floor(2)
         Hour(8, 0)
         """
-        return self // interval * type(self)(interval)
+        interval = self._to_total(interval)
+        return self._from_total(self.total // interval * interval)
 
     def ceil(self: Self, interval: Self | str | float = 1):
         """
@@ -171,8 +239,9 @@ class Hour:
         >>> Hour(9, 0).ceil(2)
         Hour(10, 0)
         """
-        interval = type(self)(interval)
-        return self.floor(interval) + (0 if (self % interval).total == 0 else interval)
+        interval = self._to_total(interval)
+        remainder = self.total % interval
+        return self._from_total(self.total - remainder + (interval if remainder else 0))
 
     def __add__(self: Self, other: Self | str | float):
         """
@@ -181,7 +250,7 @@ class Hour:
         >>> Hour(23, 59) + Hour(0, 2)
         Hour(0, 1)
         """
-        return type(self)(self.total + type(self)(other).total, True)
+        return self._from_total(self.total + self._to_total(other))
 
     __radd__ = __iadd__ = __add__
 
@@ -192,7 +261,7 @@ class Hour:
         >>> Hour(0, 1) - Hour(0, 2)
         Hour(23, 59)
         """
-        return type(self)(self.total - type(self)(other).total, True)
+        return self._from_total(self.total - self._to_total(other))
 
     __rsub__ = __isub__ = __sub__
 
@@ -205,7 +274,9 @@ class Hour:
         >>> Hour(12, 1) * 2
         Hour(0, 2)
         """
-        return type(self)(self.total * other, True)
+        if not isinstance(other, (int, float)):
+            raise TypeError("Trying to create an Hour instance from a total but the total is not an int/float")
+        return self._from_total(self.total * other)
 
     __rmul__ = __imul__ = __mul__
 
@@ -216,7 +287,7 @@ class Hour:
         >>> round(Hour(8, 0) / 3, 3)
         2.667
         """
-        return self.total / type(self)(other).total
+        return self.total / self._to_total(other)
 
     __rtruediv__ = __itruediv__ = __truediv__
 
@@ -227,7 +298,7 @@ class Hour:
         >>> Hour(8, 0) // 3
         2
         """
-        return self.total // type(self)(other).total
+        return self.total // self._to_total(other)
 
     __rfloordiv__ = __ifloordiv__ = __floordiv__
 
@@ -238,7 +309,7 @@ class Hour:
         >>> Hour(9, 0) % 2
         Hour(1, 0)
         """
-        return type(self)(self.total % type(self)(other).total, True)
+        return self._from_total(self.total % self._to_total(other))
 
     __rmod__ = __imod__ = __mod__
 
@@ -258,7 +329,7 @@ class Hour:
         >>> -Hour(0, 0)
         Hour(0, 0)
         """
-        return type(self)(-self.total, True)
+        return self._from_total(-self.total)
 
     def __int__(self):
         """
@@ -289,6 +360,39 @@ class Hour:
             return self.total < other.total
         return NotImplemented
 
+    def __le__(self, other):
+        """
+        >>> Hour(8, 0) <= Hour(8, 0)
+        True
+        >>> Hour(8, 30) <= Hour(8, 0)
+        False
+        """
+        if isinstance(other, type(self)):
+            return self.total <= other.total
+        return NotImplemented
+
+    def __gt__(self, other):
+        """
+        >>> Hour(8, 30) > Hour(8, 0)
+        True
+        >>> Hour(8, 0) > Hour(8, 0)
+        False
+        """
+        if isinstance(other, type(self)):
+            return self.total > other.total
+        return NotImplemented
+
+    def __ge__(self, other):
+        """
+        >>> Hour(8, 0) >= Hour(8, 0)
+        True
+        >>> Hour(8, 0) >= Hour(8, 30)
+        False
+        """
+        if isinstance(other, type(self)):
+            return self.total >= other.total
+        return NotImplemented
+
     def __eq__(self, other):
         """
         >>> Hour(8, 0) == Hour(8, 0)
@@ -296,6 +400,9 @@ class Hour:
         >>> Hour(8, 0) == Hour(8, 30)
         False
         """
+        # The hours created from a total are shared
+        if self is other:
+            return True
         if isinstance(other, type(self)):
             return self.total == other.total
         return NotImplemented
@@ -345,7 +452,24 @@ class Week(enum.IntEnum):
     RIGHT = 2
 
 
-@dataclass
+@lru_cache(maxsize=64)
+def hex_to_color(color: str) -> DeviceRGB:
+    """
+    Convert a `#RRGGBB` color to a `DeviceRGB` object.
+
+    Timetables only use a few different colors, so the results are cached.
+
+    >>> hex_to_color("#ff8000")
+    DeviceRGB(r=1.0, g=0.5019607843137255, b=0.0, a=None)
+    """
+    # int() also accepts signs, spaces and underscores
+    if not color[1:].isalnum():
+        raise ValueError(f"Invalid color: {color!r}")
+    value = int(color[1:], 16)
+    return DeviceRGB((value >> 16) / 255, (value >> 8 & 0xFF) / 255, (value & 0xFF) / 255, None)
+
+
+@dataclass(slots=True)
 class Lesson:
     """A lesson in a timetable."""
 
@@ -361,19 +485,14 @@ class Lesson:
     def __post_init__(self):
         if isinstance(self.color, str) and len(self.color) == 7 and self.color[0] == "#":
             try:
-                self.color = DeviceRGB(
-                    int(self.color[1:3], 16) / 255,
-                    int(self.color[3:5], 16) / 255,
-                    int(self.color[5:7], 16) / 255,
-                    None,
-                )
+                self.color = hex_to_color(self.color)
             except ValueError:
                 pass
 
         self.room = str(self.room)
 
 
-@dataclass
+@dataclass(slots=True)
 class Day:
     """A day in a timetable."""
 
@@ -384,7 +503,7 @@ class Day:
         return iter(self.lessons)
 
 
-@dataclass
+@dataclass(slots=True)
 class Timetable:
     """A timetable."""
 
@@ -399,6 +518,22 @@ class Timetable:
     def __len__(self):
         return len(self.days)
 
+    def week_name(self, week: Week):
+        """
+        Return the name of a week (an empty string for the lessons that happen every week).
+
+        >>> timetable = Timetable(left_week="A", right_week="B")
+        >>> timetable.week_name(Week.ALWAYS)
+        ''
+        >>> timetable.week_name(Week.RIGHT)
+        'B'
+        """
+        if week == Week.LEFT:
+            return self.left_week
+        if week == Week.RIGHT:
+            return self.right_week
+        return ""
+
     @classmethod
     def from_data(cls, data: str):
         """Create a timetable from data contained in a timetable file."""
@@ -409,7 +544,7 @@ class Timetable:
         return TimetableParser(data).timetable
 
 
-@dataclass
+@dataclass(slots=True)
 class Pause:
     """A pause (a range between two `Hour`s)."""
     start: Hour
@@ -425,16 +560,22 @@ class Pause:
         Pause(start=Hour(12, 0), end=Hour(13, 0))
         >>> Pause.intersection(Pause(Hour(11), Hour(13)), Pause(Hour(12), Hour(14)))
         Pause(start=Hour(12, 0), end=Hour(13, 0))
+        >>> Pause.intersection(Pause(Hour(11), Hour(13)))
+        Pause(start=Hour(11, 0), end=Hour(13, 0))
         """
         # If there are no pauses, stop here to avoid further errors with max and min
         if not pauses:
             return None
-        # Latest start hour
-        start = max(*(pause.start for pause in pauses))
-        # Earliest end hour
-        end = min(*(pause.end for pause in pauses))
+        start, end = pauses[0].start, pauses[0].end
+        for pause in pauses[1:]:
+            # Latest start hour
+            if pause.start.total > start.total:
+                start = pause.start
+            # Earliest end hour
+            if pause.end.total < end.total:
+                end = pause.end
         # If a pause begins after another ends, it means there is no intersection
-        if end < start:
+        if end.total < start.total:
             return None
         return cls(start, end)
 
@@ -473,7 +614,7 @@ class Pause:
         return self.start <= other.start and other.end <= self.end
 
 
-@dataclass
+@dataclass(slots=True)
 class Pauses:
     """An object that holds the `Pause` objects for a day."""
     start: Hour
@@ -543,7 +684,7 @@ class Pauses:
         return itertools.chain((Pause(Hour(0), self.start),), self.pauses, (Pause(self.end, Hour(-1, True)),))
 
 
-@dataclass
+@dataclass(slots=True)
 class PausesContainer:
     """An object that holds a list of `Pauses` objects (pauses for each day)."""
     start_hour: Hour
@@ -570,22 +711,33 @@ class PausesContainer:
         >>> container.days.append(Pauses(Hour(8), Hour(17), [start_of_day, Pause(Hour(11), Hour(12)), end_of_day]))
         >>> container.intersection()
         """
-        # For all the combinations of pauses (all the ways to take one pause on each day)
-        for pauses in itertools.product(*self.days):
-            # If the pauses list is empty, all elements will have a length of 0 so we stop here
-            if len(pauses) == 0:
-                break
-            # Calculate the intersection of all the pauses
-            intersection = Pause.intersection(*pauses)
-            # If there is an intersection (this excludes empty pauses)
-            # and this intersection is within the day, return it
-            if intersection and intersection in Pause(self.start_hour, self.end_hour):
-                return intersection
-        # There is no intersection, return None
-        return None
+        # If there are no days, there is no pause
+        if not self.days:
+            return None
 
+        days = [[(pause.start.total, pause.end.total) for pause in day] for day in self.days]
+        start_hour, end_hour = self.start_hour.total, self.end_hour.total
+
+        def search(i: int, start: int, end: int) -> Pause | None:
+            """
+            Take one pause on each day from the `i`-th one (in the same order as `itertools.product`)
+            and return the first intersection that is within the day.
+            """
+            if i == len(days):
+                if start_hour <= start and end <= end_hour:
+                    return Pause(Hour._from_total(start), Hour._from_total(end))
+                return None
+            for pause_start, pause_end in days[i]:
+                # The intersection can only get smaller with the next days,
+                # so skip the combinations where it's already empty
+                if max(start, pause_start) < min(end, pause_end):
+                    intersection = search(i + 1, max(start, pause_start), min(end, pause_end))
+                    if intersection:
+                        return intersection
+            return None
 
-NOTHING = object()
+        # Start with the whole day, it doesn't change the intersection
+        return search(0, 0, 24 * 60 - 1)
 
 
 @dataclass
@@ -612,17 +764,12 @@ class _SettingsBase:
         >>> Settings.merge(Settings(title_shadow=True), Settings(title_shadow=False))  # doctest: +ELLIPSIS
         Settings(..., title_shadow=False, ...)
         """
+        fields = cls.__dataclass_fields__
         kwargs = {}
 
-        for name in cls.__dataclass_fields__:
-            value = NOTHING
-            for obj in objs[::-1]:
-                # Handle nonexistent keys and None values
-                if obj.__dict__.get(name) is not None:
-                    value = obj.__dict__.get(name)
-                    break
-            if value is not NOTHING:
-                kwargs[name] = value
+        for obj in objs:
+            # Handle nonexistent keys and None values
+            kwargs.update((name, value) for name, value in obj.__dict__.items() if value is not None and name in fields)
 
         return cls(**kwargs)
 
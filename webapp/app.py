@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 
 from flask import Flask, Response, render_template, request, session
@@ -19,6 +20,16 @@ remote_url = remote_url_file.read_text("utf-8") if remote_url_file.exists() else
 
 app = Flask(__name__)
 
+MINIFY_OPTIONS = {"minify_css": True, "minify_js": True, "do_not_minify_doctype": True}
+# Smaller responses aren't worth minifying
+MINIFY_MIN_LENGTH = 1024
+
+
+@lru_cache(maxsize=32)
+def parse_timetable(data: str) -> TimetableParser:
+    """Parse a timetable file. The results are cached because the same files are sent again when the form is fixed."""
+    return TimetableParser(data)
+
 
 @app.after_request
 def minify_response(response: Response):
@@ -30,7 +41,8 @@ def minify_response(response: Response):
             # If we can't get the data because it's a stream
             # or because of a wrong encoding, we stop here
             return response
-        response.set_data(minify_html.minify(data, minify_css=True, minify_js=True, do_not_minify_doctype=True))
+        if len(data) >= MINIFY_MIN_LENGTH:
+            response.set_data(minify_html.minify(data, **MINIFY_OPTIONS))
     return response
 
 
@@ -61,7 +73,7 @@ def timetable():
     pdf = PatchedFPDF()
     settings = WebSettings(**settings_dict)
     for file in files:
-        result = TimetableParser(file.read())
+        result = parse_timetable(file.read())
         tt = result.timetable
         TimetableRenderer(tt, Settings.merge(result.settings, settings)).render(pdf)
 
@@ -72,7 +84,7 @@ def timetable():
 def timetable_render():
     """View that renders the timetable PDF."""
     pdf = PatchedFPDF()
-    result = TimetableParser(request.files["file"].stream.read().decode("utf-8"))
+    result = parse_timetable(request.files["file"].stream.read().decode("utf-8"))
     tt = result.timetable
     TimetableRenderer(tt, Settings.merge(result.settings)).render(pdf)
     return Response(bytes(pdf.output()), content_type="application/pdf")
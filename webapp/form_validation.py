@@ -1,4 +1,5 @@
 from dataclasses import dataclass, field
+from functools import lru_cache
 import html
 import io
 from typing import Any, Callable, get_args, get_origin
@@ -10,7 +11,11 @@ import typer
 
 def escape(s: Any):
     """Escape a string for HTML output purposes."""
-    return html.escape(str(s))
+    s = str(s)
+    # Identifiers (field names, input types...) can't contain any character that must be escaped
+    if s.isidentifier():
+        return s
+    return html.escape(s)
 
 
 @dataclass
@@ -21,6 +26,18 @@ class Params:
     args: dict[str, str] = field(default_factory=dict)
 
 
+@lru_cache(maxsize=None)
+def get_schema(function: Callable) -> dict[str, Params]:
+    """Return the form schema for the parameters of a function (they are only inspected once)."""
+    from typer.utils import get_params_from_function
+
+    params = get_params_from_function(function)
+    schema = {}
+    for name, value in params.items():
+        schema[name] = Params(value.name.replace("_", " ").capitalize(), value)
+    return schema
+
+
 def render_form(
     schema: dict[str, Params] | Callable,
     initial_data: dict[str, Any] | None = None,
@@ -35,7 +52,8 @@ def render_form(
             data = data.copy()
         errors_occured = False
 
-        ret = '<form method="post">'
+        # Build the HTML in a list and join it at the end
+        parts = ['<form method="post">']
         for key, params in schema.items():
             name = params.name
             input_type = params.input_type
@@ -91,15 +109,18 @@ def render_form(
                 default = initial_data.get(key) if initial_data else None
 
             is_textarea = args["type"] == "textarea"
+            # Files are sent separately from the other fields
+            values = request.files if args["type"] == "file" else request.form
             data.setdefault(key, default)
-            if is_textarea:
-                data[key] = data[key].splitlines()
 
             if check_errors:
                 errors = []
 
                 if annotation is list:
-                    data[key] = request.form.getlist(key) or request.files.getlist(key) or data[key]
+                    data[key] = values.getlist(key) or data[key]
+                    # Only split the text when the lines must be validated
+                    if is_textarea and isinstance(data[key], str):
+                        data[key] = data[key].splitlines()
                     if data[key] and isinstance(data[key], list):
                         if isinstance(data[key][0], FileStorage):
                             data[key] = [item.stream for item in data[key]]
@@ -111,7 +132,7 @@ def render_form(
                                     errors.append(str(err))
 
                 else:
-                    data[key] = request.form.get(key) or request.files.get(key) or data[key]
+                    data[key] = values.get(key) or data[key]
                     if real_type is bool:
                         data[key] = key in request.form
                     if isinstance(data[key], FileStorage):
@@ -124,21 +145,20 @@ def render_form(
 
                 if errors:
                     errors_occured = True
-                    ret += '<ul class="errors">'
-                    for line in errors:
-                        ret += f"<li>{escape(line)}</li>"
-                    ret += "</ul>"
+                    parts.append('<ul class="errors">')
+                    parts.extend(f"<li>{escape(line)}</li>" for line in errors)
+                    parts.append("</ul>")
 
-            ret += f'<p><label for="{key}">{escape(name)} :</label>'
+            parts.append(f'<p><label for="{key}">{escape(name)} :</label>')
 
             if is_textarea:
-                ret += "<br>"
+                parts.append("<br>")
             else:
-                ret += " "
+                parts.append(" ")
 
             args["name"] = key
             args["id"] = key
-            if is_textarea:
+            if is_textarea and isinstance(data[key], list):
                 data[key] = "\n".join(data[key])
             if data[key] and not is_textarea and args["type"] != "password":
                 if isinstance(data[key], bool):
@@ -146,27 +166,20 @@ def render_form(
                         args["checked"] = ""
                 else:
                     args["value"] = str(data[key])
-            ret += (
-                ("<textarea " if is_textarea else "<input ")
-                + "".join(f'{name}="{escape(value)}"' for name, value in args.items())
-                + ">"
-            )
+            parts.append("<textarea " if is_textarea else "<input ")
+            parts.extend(f'{name}="{escape(value)}"' for name, value in args.items())
+            parts.append(">")
             if is_textarea:
-                ret += escape(data[key])
-                ret += "</textarea>"
-            ret += "</p>"
+                parts.append(escape(data[key]))
+                parts.append("</textarea>")
+            parts.append("</p>")
 
-        ret += '<p><input type="submit" value="OK"></p>'
-        ret += "</form>"
-        return ret, data, errors_occured
+        parts.append('<p><input type="submit" value="OK"></p>')
+        parts.append("</form>")
+        return "".join(parts), data, errors_occured
 
     if callable(schema):
-        from typer.utils import get_params_from_function
-
-        params = get_params_from_function(schema)
-        schema = {}
-        for name, value in params.items():
-            schema[name] = Params(value.name.replace("_", " ").capitalize(), value)
+        schema = get_schema(schema)
 
     if request.method == "POST":
         ret, data, errors_occured = _render_form(initial_data, True)